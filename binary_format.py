@@ -24,61 +24,159 @@
 
 from __future__ import annotations
 
-import itertools
+import io
 import struct
-from collections.abc import Mapping
-from io import BytesIO
-from typing import IO, cast
-
-Value = None | bool | int | float | str | bytes | list['Value'] | dict[str, 'Value']
-
-
-def value(stream: IO[bytes]) -> tuple[Value, int]:
-    def u64():
-        return cast(int, struct.unpack("<Q", stream.read(8))[0])
-
-    type = stream.read(1)[0]
-    if type == 0x01:
-        return None, 1
-    if type == 0x02:
-        return True, 1
-    if type == 0x03:
-        return False, 1
-    if type == 0x04:
-        return cast(int, *struct.unpack("<q", stream.read(8))), 9
-    if type == 0x05:
-        return cast(float, *struct.unpack("<d", stream.read(8))), 9
-    if type == 0x06:
-        data = bytearray()
-        while (byte := stream.read(1)) != b"\x00":
-            data.append(*byte)
-        return data.decode("utf-8"), len(data) + 2
-    if type == 0x07:
-        size = u64()
-        return stream.read(size), size + 9
-    if type == 0x08:
-        data = []
-        size = u64()
-        i = size
-        while i > 0:
-            item, itemsize = value(stream)
-            i -= itemsize
-            data.append(item)
-        return data, size + 9
-    if type == 0x09:
-        data = {}
-        size = u64()
-        i = size
-        while i > 0:
-            key = stream.read(4).decode("ascii").rstrip("\x00")
-            i -= 4
-            item, itemsize = value(stream)
-            i -= itemsize
-            data[key] = item
-        return data, size + 9
+from collections.abc import Callable, Iterable, Mapping
+from types import NoneType
+from typing import IO, Any, cast
+
+Value = (
+    None
+    | bool
+    | int
+    | float
+    | str
+    | bytes
+    | memoryview
+    | list['Value']
+    | dict[str, 'Value']
+)
+
+_U32 = struct.Struct("<I").unpack_from
+_U64 = struct.Struct("<Q").unpack_from
+_I64 = struct.Struct("<q").unpack_from
+_F64 = struct.Struct("<d").unpack_from
+_PACK_U64 = struct.Struct("<Q").pack
+_PACK_U64_INTO = struct.Struct("<Q").pack_into
+_PACK_I64 = struct.Struct("<q").pack
+_PACK_F64 = struct.Struct("<d").pack
+
+# Decoded OBJECT keys by their 4 bytes read as a u32, so repeated field names are
+# decoded once. Bounded, since keys come from untrusted input.
+_KEY_CACHE: dict[int, str] = {}
+_KEY_CACHE_SIZE = 4096
+
+
+def _decode_none(
+    data: bytes | bytearray, view: memoryview, offset: int
+) -> tuple[Value, int]:
+    return None, offset
+
+
+def _decode_true(
+    data: bytes | bytearray, view: memoryview, offset: int
+) -> tuple[Value, int]:
+    return True, offset
+
+
+def _decode_false(
+    data: bytes | bytearray, view: memoryview, offset: int
+) -> tuple[Value, int]:
+    return False, offset
+
+
+def _decode_int(
+    data: bytes | bytearray, view: memoryview, offset: int
+) -> tuple[Value, int]:
+    return cast(int, _I64(data, offset)[0]), offset + 8
+
+
+def _decode_float(
+    data: bytes | bytearray, view: memoryview, offset: int
+) -> tuple[Value, int]:
+    return cast(float, _F64(data, offset)[0]), offset + 8
+
+
+def _decode_string(
+    data: bytes | bytearray, view: memoryview, offset: int
+) -> tuple[Value, int]:
+    nul = data.index(0x00, offset)
+    return str(view[offset:nul], "utf-8"), nul + 1
+
+
+def _decode_bytes(
+    data: bytes | bytearray, view: memoryview, offset: int
+) -> tuple[Value, int]:
+    size = cast(int, _U64(data, offset)[0])
+    offset += 8
+    return view[offset : offset + size], offset + size
+
+
+def _decode_bytes_copy(
+    data: bytes | bytearray, view: memoryview, offset: int
+) -> tuple[Value, int]:
+    size = cast(int, _U64(data, offset)[0])
+    offset += 8
+    return bytes(view[offset : offset + size]), offset + size
+
+
+def _decode_invalid(
+    data: bytes | bytearray, view: memoryview, offset: int
+) -> tuple[Value, int]:
     raise TypeError
 
 
+# Decoders for scalar VALUEs indexed by type byte, LIST and OBJECT are handled by
+# value() itself because they push a frame onto its stack.
+_DECODERS = (
+    _decode_invalid,
+    _decode_none,
+    _decode_true,
+    _decode_false,
+    _decode_int,
+    _decode_float,
+    _decode_string,
+    _decode_bytes,
+) + (_decode_invalid,) * 248
+_COPYING_DECODERS = _DECODERS[:0x07] + (_decode_bytes_copy,) + _DECODERS[0x08:]
+
+
+def value(
+    data: bytes | bytearray, offset: int = 0, *, copy: bool = False
+) -> tuple[Value, int]:
+    """Decode the VALUE at offset, return it and the offset just past it.
+
+    Containers are decoded with an explicit stack of (container, end) frames
+    instead of recursion, so deeply nested input cannot raise RecursionError.
+
+    BYTES are returned as memoryview slices of data unless copy is True.
+    """
+    view = memoryview(data)
+    decoders = _COPYING_DECODERS if copy else _DECODERS
+    key_cache = _KEY_CACHE
+    root: list[Value] = []
+    # The root frame ends after exactly one value, every value is at least 1 byte.
+    stack: list[tuple[list[Value] | dict[str, Value], int]] = [(root, offset + 1)]
+    while stack:
+        container, end = stack[-1]
+        if offset >= end:
+            stack.pop()
+            continue
+        key = ""
+        if isinstance(container, dict):
+            raw = _U32(data, offset)[0]
+            key = key_cache.get(raw)
+            if key is None:
+                key = str(view[offset : offset + 4], "ascii").rstrip("\x00")
+                if len(key_cache) < _KEY_CACHE_SIZE:
+                    key_cache[raw] = key
+            offset += 4
+        type = data[offset]
+        item: Value
+        if type == 0x08 or type == 0x09:
+            size = cast(int, _U64(data, offset + 1)[0])
+            offset += 9
+            item = [] if type == 0x08 else {}
+            stack.append((item, offset + size))
+        else:
+            item, offset = decoders[type](data, view, offset + 1)
+        if isinstance(container, dict):
+            container[key] = item
+        else:
+            container.append(item)
+    return root[0], offset
+
+
 def seek(stream: IO[bytes], selector: list[str | int]) -> Value:
     def skip():
         type = stream.read(1)[0]
@@ -92,69 +190,170 @@ def seek(stream: IO[bytes], selector: list[str | int]) -> Value:
         
 
 
+def _encode_none(value: None, buffer: bytearray) -> None:
+    buffer.append(0x01)
+
+
+def _encode_bool(value: bool, buffer: bytearray) -> None:
+    buffer.append(0x02 if value else 0x03)
+
+
+def _encode_int(value: int, buffer: bytearray) -> None:
+    buffer.append(0x04)
+    buffer.extend(_PACK_I64(value))
+
+
+def _encode_float(value: float, buffer: bytearray) -> None:
+    buffer.append(0x05)
+    buffer.extend(_PACK_F64(value))
+
+
+def _encode_string(value: str, buffer: bytearray) -> None:
+    buffer.append(0x06)
+    buffer.extend(value.encode("utf-8"))
+    buffer.append(0x00)
+
+
+def _encode_bytes(value: bytes | bytearray | memoryview, buffer: bytearray) -> None:
+    buffer.append(0x07)
+    buffer.extend(_PACK_U64(len(value)))
+    buffer.extend(value)
+
+
+def _encode_object(value: Mapping[object, object], buffer: bytearray) -> None:
+    buffer.append(0x09)
+    buffer += b"\x00" * 8
+    length = len(buffer)
+    encoders = _ENCODERS
+    for key, item in value.items():
+        if not isinstance(key, str):
+            raise TypeError
+        buffer += key.encode("ascii")[:4].ljust(4, b"\x00")
+        encode = encoders.get(type(item), serialize)
+        encode(item, buffer)
+    _PACK_U64_INTO(buffer, length - 8, len(buffer) - length)
+
+
+def _encode_list(value: Iterable[object], buffer: bytearray) -> None:
+    buffer.append(0x08)
+    buffer += b"\x00" * 8
+    length = len(buffer)
+    encoders = _ENCODERS
+    for item in value:
+        encode = encoders.get(type(item), serialize)
+        encode(item, buffer)
+    _PACK_U64_INTO(buffer, length - 8, len(buffer) - length)
+
+
+# Encoders keyed by exact type, serialize() adds other types to it on first use.
+_ENCODERS: dict[type, Callable[[Any, bytearray], None]] = {
+    NoneType: _encode_none,
+    bool: _encode_bool,
+    int: _encode_int,
+    float: _encode_float,
+    str: _encode_string,
+    bytes: _encode_bytes,
+    bytearray: _encode_bytes,
+    memoryview: _encode_bytes,
+    dict: _encode_object,
+    list: _encode_list,
+    tuple: _encode_list,
+}
+
+
+def _resolve_encoder(cls: type) -> Callable[[Any, bytearray], None] | None:
+    if issubclass(cls, int):
+        return _encode_int
+    if issubclass(cls, float):
+        return _encode_float
+    if issubclass(cls, str):
+        return _encode_string
+    if issubclass(cls, (bytes, bytearray, memoryview)):
+        return _encode_bytes
+    if issubclass(cls, Mapping):
+        return _encode_object
+    if issubclass(cls, Iterable):
+        return _encode_list
+    return None
+
+
 def serialize(value: object, buffer: bytearray):
-    if value is None:
-        buffer.append(0x01)
-        return
-    if value is True:
-        buffer.append(0x02)
-        return
-    if value is False:
-        buffer.append(0x03)
-        return
-    if isinstance(value, int):
-        buffer.append(0x04)
-        buffer.extend(struct.pack("<q", value))
-        return
-    if isinstance(value, float):
-        buffer.append(0x05)
-        buffer.extend(struct.pack("<d", value))
-        return
-    if isinstance(value, str):
-        buffer.append(0x06)
-        buffer.extend(value.encode("utf-8"))
-        buffer.append(0x00)
-        return
-    if isinstance(value, (bytes, bytearray, memoryview)):
-        buffer.append(0x07)
-        buffer.extend(struct.pack("<Q", len(value)))
-        buffer.extend(value)
-        return
-    if isinstance(value, Mapping):
-        buffer.append(0x09)
-        for _ in range(8):
-            buffer.append(0)
-        length = len(buffer)
-        for key, item in value.items():
-            if not isinstance(key, str):
-                raise TypeError
-            key = key.encode("ascii")[:4]
-            buffer.extend(key)
-            for _ in range(4 - len(key)):
-                buffer.append(0)
-            serialize(item, buffer)
-        size = struct.pack("<Q", len(buffer) - length)
-        buffer[length - 8 : length] = size
-        return
-    try:
-        it = iter(value)  # type: ignore
-        buffer.append(0x08)
-        for _ in range(8):
-            buffer.append(0)
-        length = len(buffer)
-        for value in it:
-            serialize(value, buffer)
-        size = struct.pack("<Q", len(buffer) - length)
-        buffer[length - 8 : length] = size
-        return
-    except TypeError:
-        pass
-
-
-def unpack(data: IO[bytes] | bytes | bytearray | memoryview) -> Value:
-    if isinstance(data, (bytes, bytearray, memoryview)):
-        return value(BytesIO(data))[0]
-    return value(data)[0]
+    cls = type(value)
+    encode = _ENCODERS.get(cls)
+    if encode is None:
+        encode = _resolve_encoder(cls)
+        if encode is None:
+            # Not registered as an Iterable, but may still support iteration
+            # through __getitem__.
+            try:
+                it = iter(value)  # type: ignore
+            except TypeError:
+                return
+            _encode_list(it, buffer)
+            return
+        _ENCODERS[cls] = encode
+    encode(value, buffer)
+
+
+def _read(stream: IO[bytes], size: int, buffer: bytearray) -> None:
+    """Read size bytes from stream into buffer, stopping early only at EOF."""
+    while size > 0 and (chunk := stream.read(size)):
+        buffer += chunk
+        size -= len(chunk)
+
+
+def _read_value(stream: IO[bytes]) -> bytearray:
+    """Read the bytes of exactly one VALUE from stream, without decoding it.
+
+    The sizes of BYTES, LIST and OBJECT are in bytes, so their contents are read
+    in one go and only a STRING needs to be scanned for its end.
+    """
+    buffer = bytearray()
+    _read(stream, 1, buffer)
+    if not buffer:
+        return buffer
+    type = buffer[0]
+    if type == 0x04 or type == 0x05:
+        _read(stream, 8, buffer)
+    elif type == 0x06:
+        while (byte := stream.read(1)) and byte != b"\x00":
+            buffer += byte
+        buffer += byte
+    elif 0x07 <= type <= 0x09:
+        _read(stream, 8, buffer)
+        if len(buffer) == 9:
+            _read(stream, cast(int, _U64(buffer, 1)[0]), buffer)
+    return buffer
+
+
+def unpack(
+    data: IO[bytes] | bytes | bytearray | memoryview, *, copy: bool = False
+) -> Value:
+    """Decode data.
+
+    BYTES are returned as memoryview slices of data, which keep it alive and
+    prevent a bytearray from being resized. Pass copy=True to get bytes instead.
+    A memoryview which doesn't cover all of a bytes or bytearray is copied first.
+
+    Exactly one VALUE is consumed from a stream. A seekable stream is read to its
+    end and seeked back to just past the VALUE, others are read piece by piece.
+    """
+    if isinstance(data, memoryview):
+        obj = data.obj
+        if isinstance(obj, (bytes, bytearray)) and data.nbytes == len(obj):
+            data = obj
+        else:
+            data = data.tobytes()
+    elif not isinstance(data, (bytes, bytearray)):
+        stream = data
+        if not stream.seekable():
+            return value(_read_value(stream), copy=copy)[0]
+        data = stream.read()
+        result, offset = value(data, copy=copy)
+        if offset < len(data):
+            stream.seek(offset - len(data), io.SEEK_CUR)
+        return result
+    return value(data, copy=copy)[0]
 
 
 def pack(value: object) -> bytearray:
@@ -164,11 +363,8 @@ def pack(value: object) -> bytearray:
 
 
 def hexdump(data: bytes|bytearray):
-    for batch in itertools.batched(data, 16):
-        print(end="|")
-        for i in batch:
-            print(hex(i)[2:].rjust(2, "0"), end="|")
-        print()
+    for i in range(0, len(data), 16):
+        print(f"|{data[i : i + 16].hex('|')}|")
 
 
 sample = {
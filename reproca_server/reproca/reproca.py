@@ -30,9 +30,10 @@ from reproca.typescript import TypeScriptWriter
 from . import resources
 
 if TYPE_CHECKING:
-    from collections.abc import Awaitable, Callable
+    from collections.abc import Awaitable, Callable, Iterable
     from starlette.middleware import Middleware
     from starlette.types import ExceptionHandler, Lifespan
+    from reproca.typescript import Declarations
 
 
 class Method(msgspec.Struct):
@@ -48,6 +49,9 @@ R = TypeVar("R")
 I = TypeVar("I")
 U = TypeVar("U")
 
+# Annotation names of a method which are not RPC parameters.
+RESERVED_NAMES = frozenset(("return", "request", "response", "session"))
+
 
 class Reproca(Generic[I, U]):
     """Builds a `starlette.applications.Starlette` application.
@@ -65,6 +69,8 @@ class Reproca(Generic[I, U]):
         self.sessions: Sessions[I, U] = Sessions()
         self.methods: list[Method] = []
         self.debug = debug
+        # TypeScript declarations of the last typescript() call, reused by the next.
+        self.declarations: Declarations = {}
 
     def build(
         self,
@@ -88,7 +94,7 @@ class Reproca(Generic[I, U]):
         for method in self.methods:
             routes.append(Route(method.path, method.handler, methods=["POST"]))
         if self.debug:
-            routes.append(Route("/docs", self._docs, methods=["GET"]))
+            routes.append(Route("/docs", self._docs(), methods=["GET"]))
             routes.append(
                 Route(
                     "/docs.css",
@@ -111,16 +117,27 @@ class Reproca(Generic[I, U]):
     def _resource_file(
         self, path: str, content_type: str = "text/plain"
     ) -> Callable[[Request], Coroutine[Any, Any, starlette.responses.Response]]:
+        content = (files(resources) / path).read_bytes()
+        headers = {"Content-Type": content_type}
+
         async def handler(_request: Request) -> starlette.responses.Response:
-            return starlette.responses.Response(
-                (files(resources) / path).read_text(),
-                headers={"Content-Type": content_type},
-            )
+            return starlette.responses.Response(content, headers=headers)
+
+        return handler
+
+    def _docs(
+        self,
+    ) -> Callable[[Request], Coroutine[Any, Any, starlette.responses.Response]]:
+        # Methods can't change after build(), so the page is rendered only once.
+        html = self._render_docs().encode()
+
+        async def handler(_request: Request) -> starlette.responses.Response:
+            return starlette.responses.HTMLResponse(html)
 
         return handler
 
-    async def _docs(self, _request: Request) -> starlette.responses.HTMLResponse:
-        return starlette.responses.HTMLResponse(
+    def _render_docs(self) -> str:
+        return (
             f"""
             <!DOCTYPE html>
             <html lang="en">
@@ -191,38 +208,72 @@ class Reproca(Generic[I, U]):
         if "return" not in ann:
             msg = f"Return type annotation missing for method {func.__name__}."
             raise SyntaxError(msg)
-        pass_request = False
-        if obj := ann.get("request"):
-            if obj is not Request:
-                msg = f"Type of request must be {Request} in method {func.__name__}."
-                raise SyntaxError(msg)
-            pass_request = True
-        pass_response = False
-        if obj := ann.get("response"):
-            if obj is not Response:
-                msg = f"Type of response must be {Response} in method {func.__name__}."
-                raise SyntaxError(msg)
-            pass_response = True
-        pass_session = False
-        pass_session_optional = False
-        if obj := ann.get("session"):
-            pass_session = True
-            if get_origin(obj) is UnionType:
-                pass_session_optional = True
+        if (obj := ann.get("request")) and obj is not Request:
+            msg = f"Type of request must be {Request} in method {func.__name__}."
+            raise SyntaxError(msg)
+        if (obj := ann.get("response")) and obj is not Response:
+            msg = f"Type of response must be {Response} in method {func.__name__}."
+            raise SyntaxError(msg)
         params = [
             (argname, argtype)
             for argname, argtype in ann.items()
-            if argname not in ["return", "request", "response", "session"]
+            if argname not in RESERVED_NAMES
         ]
+        handler = self._handler(func, ann, params)
+        self.methods.append(
+            Method(f"/{func.__name__}", handler, func, params, ann["return"])
+        )
+        return func
+
+    def _handler(
+        self,
+        func: Callable[..., Awaitable[Any]],
+        ann: dict[str, Any],
+        params: list[tuple[str, object]],
+    ) -> Callable[[Request], Coroutine[Any, Any, starlette.responses.Response]]:
+        pass_request = bool(ann.get("request"))
+        pass_response = bool(ann.get("response"))
+        pass_session = bool(session := ann.get("session"))
+        pass_session_optional = get_origin(session) is UnionType
         payloadtype = msgspec.defstruct("payloadtype", params)
+        # Built on the first request, since building it resolves the annotations of
+        # parameter types, which may refer to types defined after the method.
+        decoder: msgspec.json.Decoder[Any] | None = None
+        encoder = msgspec.json.Encoder()
 
-        async def handler(request: Request) -> starlette.responses.Response:
+        async def decode(request: Request) -> dict[str, Any] | None:
+            nonlocal decoder
+            if decoder is None:
+                decoder = msgspec.json.Decoder(payloadtype)
             try:
-                body = msgspec.json.decode(await request.body(), type=payloadtype)
+                body = decoder.decode(await request.body())
             except msgspec.DecodeError:
+                return None
+            return msgspec.structs.asdict(body)
+
+        def encode(
+            body: object,
+            headers: Mapping[str, str] | None = None,
+            cookies: Iterable[tuple[bytes, bytes]] = (),
+        ) -> starlette.responses.Response:
+            response = starlette.responses.Response(
+                encoder.encode(body),
+                headers={"Content-Type": "application/json", **(headers or {})},
+            )
+            response.raw_headers.extend(cookies)
+            if self.debug:
+                print(response.__dict__)
+            return response
+
+        async def plain_handler(request: Request) -> starlette.responses.Response:
+            if (kwargs := await decode(request)) is None:
+                return starlette.responses.Response(status_code=400)
+            return encode(await func(**kwargs))
+
+        async def handler(request: Request) -> starlette.responses.Response:
+            if (kwargs := await decode(request)) is None:
                 return starlette.responses.Response(status_code=400)
             response_params = Response()
-            kwargs = {param: getattr(body, param) for param, _ in params}
             if pass_request:
                 kwargs["request"] = request
             if pass_response:
@@ -234,24 +285,17 @@ class Reproca(Generic[I, U]):
                 if not pass_session_optional and session is None:
                     return starlette.responses.Response(status_code=401)
                 kwargs["session"] = session
-            body = await func(**kwargs)  # type: ignore
-            response = starlette.responses.Response(
-                msgspec.json.encode(body),
-                headers={"Content-Type": "application/json", **response_params.headers},
-            )
-            for cookie in response_params.cookies:
-                response.set_cookie(*cookie)
+            body = await func(**kwargs)
             if response_params.should_logout:
                 if session_id := request.cookies.get("reproca_session_id"):
                     self.sessions.remove_by_sessionid(session_id)
-            if self.debug:
-                print(response.__dict__)
-            return response
+            return encode(body, response_params.headers, response_params.cookies)
 
-        self.methods.append(
-            Method(f"/{func.__name__}", handler, func, params, ann["return"])
-        )
-        return func
+        # Methods which don't take request, response or session can't set cookies,
+        # headers or logout, so they use a handler which skips all of that.
+        if not (pass_request or pass_response or pass_session):
+            return plain_handler
+        return handler
 
     def typescript(self, file: IO[str]) -> None:
         """Write typescript definitions to file.
@@ -260,7 +304,7 @@ class Reproca(Generic[I, U]):
 
         `reproca_config.ts` should default export a `Reproca` client object.
         """
-        writer = TypeScriptWriter(file)
+        writer = TypeScriptWriter(file, self.declarations)
         writer.write(
             'import type {ReprocaMethodResponse} from "./reproca";'
             'import reproca from "./reproca_config.ts";'
@@ -268,3 +312,5 @@ class Reproca(Generic[I, U]):
         for method in self.methods:
             writer.reproca_method(method)
         writer.resolve()
+        writer.flush()
+        self.declarations = writer.declarations
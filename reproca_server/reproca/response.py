@@ -2,27 +2,23 @@ from __future__ import annotations
 
 __all__ = ["Response"]
 
-from typing import TYPE_CHECKING, Literal
+import http.cookies
+from datetime import datetime
+from email.utils import format_datetime
+from typing import Literal
 
-if TYPE_CHECKING:
-    from datetime import datetime
+# Raw Set-Cookie headers for the session cookie, matching what
+# starlette.responses.Response.set_cookie would produce.
+SESSION_COOKIE = b"reproca_session_id=%b; HttpOnly; Path=/; SameSite=strict; Secure"
+UNSET_SESSION_COOKIE = (b"set-cookie", SESSION_COOKIE % b'""')
 
 
 class Response:
+    __slots__ = ("cookies", "headers", "should_logout")
+
     def __init__(self) -> None:
-        self.cookies: list[
-            tuple[
-                str,
-                str,
-                int | None,
-                datetime | str | int | None,
-                str,
-                str | None,
-                bool,
-                bool,
-                Literal["lax", "strict", "none"],
-            ]
-        ] = []
+        # Raw Set-Cookie headers, in the order they were set.
+        self.cookies: list[tuple[bytes, bytes]] = []
         self.headers: dict[str, str] = {}
         self.should_logout = False
 
@@ -39,37 +35,46 @@ class Response:
         httponly: bool = False,
         samesite: Literal["lax", "strict", "none"] = "lax",
     ) -> None:
-        self.cookies.append(
-            (
-                key,
-                value,
-                max_age,
-                expires,
-                path,
-                domain,
-                secure,
-                httponly,
-                samesite,
-            )
-        )
+        """Set a cookie, same as `starlette.responses.Response.set_cookie`.
+
+        The Set-Cookie header is formatted right away.
+        """
+        cookie: http.cookies.BaseCookie[str] = http.cookies.SimpleCookie()
+        cookie[key] = value
+        morsel = cookie[key]
+        if max_age is not None:
+            morsel["max-age"] = max_age
+        if expires is not None:
+            if isinstance(expires, datetime):
+                morsel["expires"] = format_datetime(expires, usegmt=True)
+            else:
+                morsel["expires"] = expires
+        if path is not None:
+            morsel["path"] = path
+        if domain is not None:
+            morsel["domain"] = domain
+        if secure:
+            morsel["secure"] = True
+        if httponly:
+            morsel["httponly"] = True
+        if samesite.lower() not in ("strict", "lax", "none"):
+            msg = "samesite must be either 'strict', 'lax' or 'none'"
+            raise ValueError(msg)
+        morsel["samesite"] = samesite
+        self.cookies.append((b"set-cookie", morsel.OutputString().encode("latin-1")))
 
     def set_session(self, sessionid: str) -> None:
-        self.set_cookie(
-            "reproca_session_id",
-            sessionid,
-            secure=True,
-            httponly=True,
-            samesite="strict",
+        """Set the session cookie.
+
+        sessionid must be a cookie-safe token, such as one returned by
+        `Sessions.create`.
+        """
+        self.cookies.append(
+            (b"set-cookie", SESSION_COOKIE % sessionid.encode("latin-1"))
         )
 
     def unset_session(self) -> None:
-        self.set_cookie(
-            "reproca_session_id",
-            "",
-            secure=True,
-            httponly=True,
-            samesite="strict",
-        )
+        self.cookies.append(UNSET_SESSION_COOKIE)
 
     def logout(self) -> None:
         """Unset session and remove user's session.
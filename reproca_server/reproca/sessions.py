@@ -1,35 +1,55 @@
 """Sessions management for reproca applications."""
 from __future__ import annotations
 
-__all__ = ["SESSION_VALID_FOR_DAYS", "Sessions"]
-
+__all__ = [
+    "MAX_SESSIONS",
+    "SESSION_VALID_FOR_DAYS",
+    "SESSION_VALID_FOR_SECONDS",
+    "Sessions",
+]
+
+import heapq
 import secrets
-from datetime import datetime
+import time
+from collections import OrderedDict
 from typing import Generic, TypeVar
-import msgspec
 
 T = TypeVar("T")
 U = TypeVar("U")
 D = TypeVar("D")
 
 SESSION_VALID_FOR_DAYS = 15
-
-
-class Session(msgspec.Struct, Generic[T, U]):
-    userid: T
-    user: U
-    created: datetime
-
-    def is_expired(self) -> bool:
-        return (datetime.now() - self.created).days > SESSION_VALID_FOR_DAYS
+SESSION_VALID_FOR_SECONDS = SESSION_VALID_FOR_DAYS * 86400
+MAX_SESSIONS = 100_000
+# 144 bits of entropy per session id, a multiple of 3 bytes so that its base64
+# encoding has no padding.
+SESSIONID_BYTES = 18
 
 
 class Sessions(Generic[T, U]):
-    """Manages sessions."""
-
-    def __init__(self) -> None:
-        self.sessions: dict[str, Session[T, U]] = {}
-        self.users: dict[T, str] = {}
+    """Manages sessions.
+
+    At most `max_sessions` sessions are kept, creating another one removes the least
+    recently used session. Together with `compact_expiry` this also bounds the
+    expiry heap to twice `max_sessions` entries.
+    """
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS) -> None:
+        if max_sessions < 1:
+            msg = f"max_sessions must be at least 1, got {max_sessions}."
+            raise ValueError(msg)
+        self.max_sessions = max_sessions
+        # Each field of a session is stored in its own dict keyed by session id, so
+        # looking up a user by session id is a single dict lookup. users is ordered
+        # from least to most recently used.
+        self.users: OrderedDict[str, U] = OrderedDict()
+        self.userids: dict[str, T] = {}
+        # time.monotonic() after which a session is expired.
+        self.expires: dict[str, float] = {}
+        self.sessionids: dict[T, str] = {}
+        # Min-heap of (expiry time, session id), may contain removed sessions until
+        # compact_expiry() drops them.
+        self.expiry: list[tuple[float, str]] = []
 
     def create(self, userid: T, user: U) -> str:
         """Create a session for user by user id.
@@ -38,36 +58,72 @@ class Sessions(Generic[T, U]):
         >>> response.set_session(reproca.sessions.create(...))
         """
         self.remove_by_userid(userid)
-        sessionid = secrets.token_urlsafe()
-        self.users[userid] = sessionid
-        self.sessions[sessionid] = Session(userid, user, datetime.now())
+        self.remove_expired()
+        if len(self.users) >= self.max_sessions:
+            self.remove_by_sessionid(next(iter(self.users)))
+        sessionid = secrets.token_urlsafe(SESSIONID_BYTES)
+        self.sessionids[userid] = sessionid
+        self.users[sessionid] = user
+        self.userids[sessionid] = userid
+        self.expires[sessionid] = expires = time.monotonic() + SESSION_VALID_FOR_SECONDS
+        heapq.heappush(self.expiry, (expires, sessionid))
+        if len(self.expiry) > 2 * len(self.expires):
+            self.compact_expiry()
         return sessionid
 
+    def is_expired(self, sessionid: str) -> bool:
+        """Check if a session is older than `SESSION_VALID_FOR_DAYS`."""
+        return time.monotonic() > self.expires[sessionid]
+
+    def remove_expired(self) -> None:
+        """Remove all expired sessions.
+
+        This is called by `create`, lookups only check the session they find.
+        """
+        expiry = self.expiry
+        now = time.monotonic()
+        while expiry and expiry[0][0] < now:
+            _, sessionid = heapq.heappop(expiry)
+            self.remove_by_sessionid(sessionid)
+
+    def compact_expiry(self) -> None:
+        """Rebuild the expiry heap from live sessions only.
+
+        Removed sessions stay in the heap until they expire, this is called by
+        `create` when they outnumber live ones so the heap stays within twice the
+        number of sessions.
+        """
+        self.expiry = [
+            (expires, sessionid) for sessionid, expires in self.expires.items()
+        ]
+        heapq.heapify(self.expiry)
+
     def remove_by_userid(self, userid: T) -> None:
         """Remove a session by user id."""
-        try:
-            sessionid = self.users.pop(userid)
-            self.sessions.pop(sessionid)
-        except KeyError:
-            pass
+        if (sessionid := self.sessionids.pop(userid, None)) is not None:
+            del self.users[sessionid]
+            del self.userids[sessionid]
+            del self.expires[sessionid]
 
     def remove_by_sessionid(self, sessionid: str) -> None:
         """Remove a session by session id."""
-        try:
-            session = self.sessions.pop(sessionid)
-            self.users.pop(session.userid)
-        except KeyError:
-            pass
+        if sessionid in self.users:
+            del self.users[sessionid]
+            del self.expires[sessionid]
+            del self.sessionids[self.userids.pop(sessionid)]
 
     def get_by_userid(self, userid: T, default: D = None) -> U | D:
         """Get user by user id, return default if not found."""
-        if sessionid := self.users.get(userid):
-            if session := self.sessions.get(sessionid):
-                return session.user
+        if (sessionid := self.sessionids.get(userid)) is not None:
+            return self.get_by_sessionid(sessionid, default)
         return default
 
     def get_by_sessionid(self, sessionid: str, default: D = None) -> U | D:
         """Get user by session id, return default if not found."""
-        if session := self.sessions.get(sessionid):
-            return session.user
-        return default
+        if (expires := self.expires.get(sessionid)) is None:
+            return default
+        if time.monotonic() > expires:
+            self.remove_by_sessionid(sessionid)
+            return default
+        self.users.move_to_end(sessionid)
+        return self.users[sessionid]
@@ -4,25 +4,20 @@ import hashlib
 
 __all__ = []
 
-import functools
+import collections.abc
 import sys
 import typing
 from datetime import datetime
-from hashlib import sha512
+from hashlib import blake2b
 from types import NoneType, UnionType
 from typing import (
     IO,
     TYPE_CHECKING,
     Callable,
-    Collection,
+    ForwardRef,
     Generic,
     Iterable,
     Literal,
-    Mapping,
-    MutableMapping,
-    MutableSequence,
-    MutableSet,
-    Sequence,
     TypeVar,
     Union,
     get_args,
@@ -35,10 +30,14 @@ from typing_extensions import TypeAliasType, get_original_bases
 if TYPE_CHECKING:
     from .reproca import Method
 
+T = TypeVar("T")
+
 
 class HashFile:
+    __slots__ = ("file", "hash")
+
     def __init__(
-        self, file: IO[str], hasher: Callable[[], hashlib._Hash] = sha512
+        self, file: IO[str], hasher: Callable[[], hashlib._Hash] = blake2b
     ) -> None:
         self.file = file
         self.hash = hasher()
@@ -49,62 +48,183 @@ class HashFile:
         return value
 
     def writelines(self, strings: Iterable[str]) -> None:
-        for string in strings:
-            self.write(string)
+        self.write("".join(strings))
+
+
+def has_forward_ref(obj: object) -> bool:
+    """Check if a type contains string annotations which need to be evaluated."""
+    if isinstance(obj, str | ForwardRef):
+        return True
+    if get_origin(obj) is Literal:
+        return False
+    return any(has_forward_ref(arg) for arg in get_args(obj))
 
 
 def get_type_alias_value(obj: TypeAliasType) -> object:
+    value = obj.__value__
+    if not has_forward_ref(value):
+        return value
+    if isinstance(value, str):
+        value = ForwardRef(value)
     globalns = getattr(sys.modules.get(obj.__module__, None), "__dict__", {})  # type: ignore
     localns = dict(vars(obj))
-    return typing._eval_type(obj.__value__, globalns, localns)  # type: ignore
+    return typing._eval_type(value, globalns, localns)  # type: ignore
+
+
+StructInfo = tuple[dict[str, object], tuple[object, ...], bool]
+
+
+def get_struct_info(struct: type[msgspec.Struct]) -> StructInfo:
+    """Get type hints, generic type parameters and if any field defaults to UNSET."""
+    params = next(
+        (
+            get_args(base)
+            for base in get_original_bases(struct)
+            if get_origin(base) is Generic
+        ),
+        (),
+    )
+    has_unset_default = any(
+        field.default is msgspec.UNSET for field in msgspec.structs.fields(struct)
+    )
+    return get_type_hints(struct), params, has_unset_default
+
+
+# Output of TypeScriptWriter.declaration() and the structs and type aliases it
+# references, by struct or type alias.
+Declarations = dict[object, tuple[str, frozenset[object]]]
 
 
 class Writer:
+    """Buffers everything written until `flush` is called."""
+
+    __slots__ = ("buffer", "file")
+
     def __init__(self, file: IO[str]) -> None:
         self.file = HashFile(file)
+        self.buffer: list[str] = []
 
     def write(self, *strings: str) -> None:
-        self.file.writelines(strings)
+        self.buffer.extend(strings)
+
+    def flush(self) -> None:
+        self.file.write("".join(self.buffer))
+        self.buffer.clear()
+
+    def render(self, write: Callable[[], None]) -> str:
+        """Return what `write()` writes instead of writing it."""
+        buffer = self.buffer
+        self.buffer = []
+        try:
+            write()
+            return "".join(self.buffer)
+        finally:
+            self.buffer = buffer
 
     def intersperse(
-        self, separator: Callable[[], None], funcs: Iterable[Callable[[], None]]
+        self, separator: str, items: Iterable[T], write: Callable[[T], None]
     ) -> None:
-        it = iter(funcs)
-        func = next(it, None)
-        while func is not None:
-            func()
-            func = next(it, None)
-            if func is not None:
-                separator()
+        first = True
+        for item in items:
+            if first:
+                first = False
+            else:
+                self.write(separator)
+            write(item)
+
+
+# TypeScript types of Python types which translate directly.
+TERMINAL_TYPES: dict[object, str] = {
+    NoneType: "null",
+    bool: "boolean",
+    int: "number",
+    float: "number",
+    str: "string",
+    bytes: "string",
+    bytearray: "string",
+    datetime: "string",
+    msgspec.UnsetType: "undefined",
+}
+# Base classes of types which aren't in TERMINAL_TYPES, or of generic types' origins
+# which aren't in TypeScriptWriter.generics.
+NUMBER_TYPES = (int, float)
+STRING_TYPES = (str, bytes, bytearray, datetime)
+MAPPING_TYPES = (dict, collections.abc.Mapping)
+ARRAY_TYPES = (list, set, frozenset, collections.abc.Collection)
 
 
 class TypeScriptWriter(Writer):
-    def __init__(self, file: IO[str]) -> None:
+    __slots__ = (
+        "cached",
+        "declarations",
+        "generics",
+        "resolved",
+        "struct_info",
+        "unresolved",
+    )
+
+    def __init__(self, file: IO[str], declarations: Declarations | None = None) -> None:
         super().__init__(file)
+        # Declarations of an earlier writer to reuse, and the ones of this writer.
+        # Objects are compared by identity, reloaded modules create new ones.
+        self.cached: Declarations = declarations or {}
+        self.declarations: Declarations = {}
+        # Referenced structs and type aliases, may contain resolved ones.
         self.unresolved: set[type[msgspec.Struct] | TypeAliasType] = set()
         self.resolved: set[object] = set()
+        # get_struct_info() by struct, resolving type hints evaluates string
+        # annotations.
+        self.struct_info: dict[type[msgspec.Struct], StructInfo] = {}
+        # Writers for generic types by their origin.
+        self.generics: dict[object, Callable[[object], None]] = {
+            list: self.array_type,
+            set: self.array_type,
+            frozenset: self.array_type,
+            collections.abc.Collection: self.array_type,
+            collections.abc.Sequence: self.array_type,
+            collections.abc.MutableSequence: self.array_type,
+            collections.abc.Set: self.array_type,
+            collections.abc.MutableSet: self.array_type,
+            tuple: self.tuple_type,
+            dict: self.mapping_type,
+            collections.abc.Mapping: self.mapping_type,
+            collections.abc.MutableMapping: self.mapping_type,
+            Literal: self.literal_type,
+            UnionType: self.union_type,
+            Union: self.union_type,
+        }
 
     def resolve(self) -> None:
-        if len(self.unresolved) == 0:
-            return
-        self.resolved.update(self.unresolved)
-        unresolved = self.unresolved
-        self.unresolved = set()
-        for obj in unresolved:
-            if isinstance(obj, TypeAliasType):
-                self.typealias(obj)
-            else:
-                self.struct(obj)
-        self.resolve()
+        declaration = self.declaration
+        while unresolved := self.unresolved - self.resolved:
+            self.resolved.update(unresolved)
+            self.unresolved = set()
+            for obj in unresolved:
+                declaration(obj)
+
+    def declaration(self, obj: type[msgspec.Struct] | TypeAliasType) -> None:
+        """Write a struct or type alias, reusing its output from an earlier writer."""
+        if (cached := self.cached.get(obj)) is None:
+            saved = self.buffer, self.unresolved
+            self.buffer, self.unresolved = [], set()
+            try:
+                if isinstance(obj, TypeAliasType):
+                    self.typealias(obj)
+                else:
+                    self.struct(obj)
+                cached = ("".join(self.buffer), frozenset(self.unresolved))
+            finally:
+                self.buffer, self.unresolved = saved
+        self.declarations[obj] = cached
+        text, references = cached
+        self.write(text)
+        self.unresolved.update(references)
 
     def typealias(self, obj: TypeAliasType) -> None:
         self.write("export type ", obj.__name__)
         if obj.__type_params__:
             self.write("<")
-            self.intersperse(
-                lambda: self.write(","),
-                (functools.partial(self.type, param) for param in obj.__type_params__),
-            )
+            self.intersperse(",", obj.__type_params__, self.type)
             self.write(">")
         self.write("=")
         self.type(get_type_alias_value(obj))
@@ -124,167 +244,139 @@ class TypeScriptWriter(Writer):
                 raise TypeError(msg)
 
     def type(self, obj: object) -> None:
+        if isinstance(obj, type):
+            if (name := TERMINAL_TYPES.get(obj)) is not None:
+                self.write(name)
+                return
+            if issubclass(obj, msgspec.Struct):
+                self.unresolved.add(obj)
+                self.write(obj.__name__)
+                return
+            if issubclass(obj, NUMBER_TYPES):
+                self.write("number")
+                return
+            if issubclass(obj, STRING_TYPES):
+                self.write("string")
+                return
+        orig = get_origin(obj)
+        if (write := self.generics.get(orig)) is not None:
+            write(obj)
+            return
         match obj:
             case msgspec.UnsetType():
                 self.write("undefined")
-            case type() if issubclass(obj, NoneType):
-                self.write("null")
             case None:
                 self.write("null")
-            case type() if issubclass(obj, bool):
-                self.write("boolean")
-            case type() if issubclass(obj, int | float):
-                self.write("number")
-            case type() if issubclass(obj, str | bytes | bytearray | datetime):
-                self.write("string")
-            case type() if issubclass(obj, msgspec.Struct):
-                if obj not in self.resolved:
-                    self.unresolved.add(obj)
-                self.write(obj.__name__)
-            case type() if obj is msgspec.UnsetType:
-                self.write("undefined")
             case TypeVar():
                 self.write(obj.__name__)
             case TypeAliasType():
-                if obj not in self.resolved:
-                    self.unresolved.add(obj)
+                self.unresolved.add(obj)
                 self.write(obj.__name__)
             case _:
-                orig = get_origin(obj)
                 match orig:
                     case TypeAliasType():
                         args = get_args(obj)
-                        if orig not in self.resolved:
-                            self.unresolved.add(orig)
+                        self.unresolved.add(orig)
                         self.write(orig.__name__)
                         self.write("<")
-                        self.intersperse(
-                            lambda: self.write(","),
-                            (functools.partial(self.type, arg) for arg in args),
-                        )
+                        self.intersperse(",", args, self.type)
                         self.write(">")
                     case type() if issubclass(orig, msgspec.Struct):
                         args = get_args(obj)
-                        if orig not in self.resolved:
-                            self.unresolved.add(orig)
+                        self.unresolved.add(orig)
                         self.write(orig.__name__)
                         self.write("<")
-                        self.intersperse(
-                            lambda: self.write(","),
-                            (functools.partial(self.type, arg) for arg in args),
-                        )
+                        self.intersperse(",", args, self.type)
                         self.write(">")
                     case type() if issubclass(orig, tuple):
-                        args = get_args(obj)
-                        if args[1:] == (...,):
-                            self.type(list[args[0]])  # type: ignore
-                            return
-                        self.write("[")
-                        self.intersperse(
-                            lambda: self.write(","),
-                            (functools.partial(self.type, arg) for arg in args),
-                        )
-                        self.write("]")
-                    case type() if issubclass(
-                        orig,
-                        list
-                        | set
-                        | frozenset
-                        | Collection
-                        | Sequence
-                        | MutableSequence
-                        | MutableSet,
-                    ):
-                        self.write("(")
-                        self.type(get_args(obj)[0])
-                        self.write(")[]")
-                    case type() if issubclass(orig, dict | Mapping | MutableMapping):
-                        args = get_args(obj)
-                        self.write("{[index:")
-                        self.type(args[0])
-                        self.write("]:")
-                        self.type(args[1])
-                        self.write("}")
-                    case orig if orig is Literal:
-                        self.intersperse(
-                            lambda: self.write("|"),
-                            (
-                                functools.partial(self.literal, arg)
-                                for arg in get_args(obj)
-                            ),
-                        )
-                    case type() if orig is UnionType:
-
-                        def do(arg: object) -> None:
-                            self.write("(")
-                            self.type(arg)
-                            self.write(")")
-
-                        self.write("(")
-                        self.intersperse(
-                            lambda: self.write("|"),
-                            (functools.partial(do, arg) for arg in get_args(obj)),
-                        )
-                        self.write(")")
+                        self.tuple_type(obj)
+                    case type() if issubclass(orig, MAPPING_TYPES):
+                        self.mapping_type(obj)
+                    case type() if issubclass(orig, ARRAY_TYPES):
+                        self.array_type(obj)
                     case _:
                         msg = f"Unsupported type: {obj!r} type={type(obj)!r}"
                         raise TypeError(msg)
 
+    def array_type(self, obj: object) -> None:
+        self.write("(")
+        self.type(get_args(obj)[0])
+        self.write(")[]")
+
+    def tuple_type(self, obj: object) -> None:
+        args = get_args(obj)
+        if args[1:] == (...,):
+            self.type(list[args[0]])  # type: ignore
+            return
+        self.write("[")
+        self.intersperse(",", args, self.type)
+        self.write("]")
+
+    def mapping_type(self, obj: object) -> None:
+        args = get_args(obj)
+        self.write("{[index:")
+        self.type(args[0])
+        self.write("]:")
+        self.type(args[1])
+        self.write("}")
+
+    def literal_type(self, obj: object) -> None:
+        self.intersperse("|", get_args(obj), self.literal)
+
+    def union_type(self, obj: object) -> None:
+        self.union_args(get_args(obj))
+
+    def union_args(self, args: Iterable[object]) -> None:
+        self.write("(")
+        self.intersperse("|", args, self.union_arg)
+        self.write(")")
+
+    def union_arg(self, arg: object) -> None:
+        self.write("(")
+        self.type(arg)
+        self.write(")")
+
     def struct(self, struct: type[msgspec.Struct]) -> None:
+        if (info := self.struct_info.get(struct)) is None:
+            info = self.struct_info[struct] = get_struct_info(struct)
+        hints, params, has_unset_default = info
         self.write(f"\n/** {struct.__doc__} */\nexport interface ", struct.__name__)
-        if params := next(
-            (
-                get_args(base)
-                for base in get_original_bases(struct)
-                if get_origin(base) is Generic
-            ),
-            None,
-        ):
+        if params:
             self.write("<")
-            self.intersperse(
-                lambda: self.write(","),
-                (functools.partial(self.type, param) for param in params),
-            )
+            self.intersperse(",", params, self.type)
             self.write(">")
         self.write("{")
-        for fieldname, fieldtype in get_type_hints(struct).items():
-            optional = False
+        for fieldname, fieldtype in hints.items():
             if (
-                get_origin(fieldtype) is UnionType
+                has_unset_default
+                and get_origin(fieldtype) is UnionType
                 and msgspec.UnsetType in (args := get_args(fieldtype))
-                and any(
-                    field.default is msgspec.UNSET
-                    for field in msgspec.structs.fields(struct)
-                )
             ):
-                args = (arg for arg in args if arg is not msgspec.UnsetType)
-                fieldtype = Union[*args]  # type: ignore
-                optional = True
-            self.write(fieldname, "?:" if optional else ":")
-            self.type(fieldtype)
+                self.write(fieldname, "?:")
+                args = [arg for arg in args if arg is not msgspec.UnsetType]
+                if len(args) == 1:
+                    self.type(args[0])
+                else:
+                    self.union_args(args)
+            else:
+                self.write(fieldname, ":")
+                self.type(fieldtype)
             self.write(";")
         self.write("}")
 
     def reproca_method(self, method: Method) -> None:
+        params = self.render(
+            lambda: self.intersperse(",", method.params, self.method_param)
+        )
+        returns = self.render(lambda: self.type(method.returns))
+        args = ",".join(name for name, _ in method.params)
         self.write(
-            f"\n/** {method.func.__doc__} */\nexport async function ",
-            method.func.__name__,
-            "(",
+            f"\n/** {method.func.__doc__} */\nexport async function "
+            f"{method.func.__name__}({params})"
+            f":Promise<ReprocaMethodResponse<{returns}>>"
+            f"{{return await reproca.callMethod({method.path!r},{{{args}}})}}"
         )
 
-        def do(name: str, obj: object) -> None:
-            self.write(name, ":")
-            self.type(obj)
-
-        self.intersperse(
-            lambda: self.write(","),
-            (functools.partial(do, name, obj) for name, obj in method.params),
-        )
-        self.write("):Promise<ReprocaMethodResponse<")
-        self.type(method.returns)
-        self.write(">>{return await reproca.callMethod(", repr(method.path), ",{")
-        self.intersperse(
-            lambda: self.write(","),
-            (functools.partial(self.write, name) for name, _ in method.params),
-        )
-        self.write("})}")
+    def method_param(self, param: tuple[str, object]) -> None:
+        self.write(param[0], ":")
+        self.type(param[1])